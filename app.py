@@ -1,12 +1,17 @@
 # packages for dash app
-from dash import Dash, no_update
+from dash import Dash, no_update, callback_context
 from dash.dependencies import Input, Output, State
 # plotting libraries
 import plotly.graph_objects as go
 # Data processing
+import os
 import numpy as np
 # custom helper functions
 import utils
+# data access backends
+import backends
+# background jobs for expensive computations
+import jobs
 # html layouts
 from layouts import *
 
@@ -16,19 +21,29 @@ DF_PNG = pd.read_csv('https://www.dropbox.com/s/i9vzubdk5klhw5q/png_database.csv
 car_name_dict = [{'label': _, 'value': _} for _ in DF_PNG.Car.unique()]
 # reset index for simpler data accessing
 DF_PNG.set_index(['Car', 'Year_made'], inplace=True)
-# download devaluation data
-DF_DEV = pd.read_csv('https://www.dropbox.com/s/g7u36zpj7i4hlxp/0_all_deval_prices_4.csv?dl=1')
-# reduce memory usage for better performance
-DF_DEV = utils.reduce_mem_usage(DF_DEV)
-# transform DataFrame for plotting, calculate yearly changes
-DF_YEARLY = utils.calculate_yearly_changes(DF_DEV)
+# select data access backend, DATA_BACKEND=parquet queries files created with backends.build_parquet_store
+if os.environ.get('DATA_BACKEND') == 'parquet':
+    BACKEND = backends.ParquetBackend(os.environ.get('DATA_STORE', 'data_store'))
+else:
+    # download devaluation data
+    DF_DEV = pd.read_csv('https://www.dropbox.com/s/g7u36zpj7i4hlxp/0_all_deval_prices_4.csv?dl=1')
+    # reduce memory usage for better performance
+    DF_DEV = utils.reduce_mem_usage(DF_DEV)
+    # keep data in memory, yearly changes are calculated once
+    BACKEND = backends.PandasBackend(DF_DEV)
 # calculate median yearly price change
-YEARLY_MEDIAN = DF_YEARLY.groupby('Year_diff')['PCT_change'].median()
-# create global DataFrames for plotting
-DF_TAB_2_MODEL = pd.DataFrame()
-DF_TAB_2_MODEL_MEDIAN = pd.DataFrame()
-DF_TAB_2_MANU = pd.DataFrame()
-DF_TAB_2_MANU_MEDIAN = pd.DataFrame()
+YEARLY_MEDIAN = BACKEND.get_yearly_median()
+# max number of manufacturer's rows plotted for each price range and year difference,
+# limits tab 2 chart's response size and rendering time for large manufacturers
+TAB_2_PLOT_ROWS = int(os.environ.get('TAB_2_PLOT_ROWS', 100))
+# manufacturer's data for tab 2 is calculated on background threads,
+# number of kept manufacturers and their total rows are limited to save worker's memory,
+# results are shared between gunicorn workers through files, separately for each data version
+JOBS = jobs.JobManager(max_results=int(os.environ.get('JOB_CACHE_RESULTS', 4)),
+                       max_size=int(os.environ.get('JOB_CACHE_ROWS', 200000)),
+                       sizeof=lambda result: len(result[0]),
+                       cache_dir=os.path.join(os.environ.get('JOB_CACHE_DIR', 'job_cache'),
+                                              f'{BACKEND.data_version()}_{TAB_2_PLOT_ROWS}'))
 
 app = Dash(__name__,
            meta_tags=[{"name": "viewport", "content": "width=device-width"}],
@@ -60,6 +75,51 @@ app.layout = html.Div(
 )
 
 
+def submit_tab_2_job(car_name):
+    """
+    Starts calculating car manufacturer's data for tab 2 graphs, all models of the same manufacturer share one job.
+    Median price change is calculated from all rows, rows for plotting are sampled.
+    Input:
+        car_name, str
+    Output:
+        jobs.Job
+    """
+    car_manufacturer = backends.get_manufacturer(car_name)
+    return JOBS.submit(car_manufacturer, BACKEND.get_data_tab_2_manu, car_manufacturer, TAB_2_PLOT_ROWS)
+
+
+def get_tab_2_job(car_name, restart_failed=False):
+    """
+    Returns car manufacturer's job for tab 2 data.
+    Job is started if this worker doesn't have it, e.g. it was started by other gunicorn worker,
+    in that case job waits for other worker's result instead of calculating it again.
+    Input:
+        car_name, str
+        restart_failed, bool, if True failed job is started again
+    Output:
+        jobs.Job
+    """
+    job = JOBS.get(backends.get_manufacturer(car_name))
+    if job is None or (restart_failed and job.failed()):
+        job = submit_tab_2_job(car_name)
+    return job
+
+
+def get_data_tab_2(job, car_name):
+    """
+    Returns data for tab 2 graphs from finished manufacturer's job and car model's data from backend
+    Input:
+        job, jobs.Job
+        car_name, str
+    Output:
+        tuple, model's DataFrame, manufacturer's DataFrame, model's and manufacturer's median price changes
+    """
+    df_manu, median_manu = job.result()
+    # model's rows and median are selected by data backend, e.g. filtered in duckdb
+    df_model, median_model = BACKEND.get_data_tab_2_model(car_name)
+    return df_model, df_manu, median_model, median_manu
+
+
 @app.callback(
     [Output('car-year-drop-menu', 'options'),
      Output('tab-2-year-select', 'options'),
@@ -77,7 +137,6 @@ def update_year_made(car_name):
     Return:
         dict, list, years that car was made, e.g. [{'label': 2009, 'value': 2009}, {'label': 2010, 'value': 2010}]
     """
-    global DF_TAB_2_MODEL, DF_TAB_2_MANU, DF_TAB_2_MODEL_MEDIAN, DF_TAB_2_MANU_MEDIAN
     # don't update during initial launch
     if car_name == 'car-name':
         return no_update
@@ -89,10 +148,8 @@ def update_year_made(car_name):
     # update png drop-down manu list year options
     years = [{'label': year, 'value': year} for year in years]
 
-    # quick but dirty solution to speed-up data loading, store element is not used- global variables instead
-    # load specific data for plotting
-    DF_TAB_2_MODEL, DF_TAB_2_MANU, DF_TAB_2_MODEL_MEDIAN, DF_TAB_2_MANU_MEDIAN = utils.get_data_tab_2_graph(DF_YEARLY,
-                                                                                                            car_name)
+    # start calculating data for tab 2 graphs before user opens it
+    submit_tab_2_job(car_name)
 
     # update dropdown with the oldest available years
     return years, years, years[0]['value'], years[0]['value'], True
@@ -136,13 +193,25 @@ def activate_calculation_btn(year_car_made, car_price):
 @app.callback(
     [Output("deval-calculation-results-collapse", "is_open"),
      Output("tab-2-calc-chart", "figure"),
-     Output("markdown-text", "children")],
-    [Input("tab-2-calcualte-deval-btn", "n_clicks")],
+     Output("markdown-text", "children"),
+     Output('tab-2-calc-interval', 'disabled')],
+    [Input("tab-2-calcualte-deval-btn", "n_clicks"),
+     Input('tab-2-calc-interval', 'n_intervals')],
     [State('tab-2-year-select', 'value'), State('tab-2-price', 'value'),
-     State("deval-calculation-results-collapse", "is_open")],
+     State("deval-calculation-results-collapse", "is_open"), State('car-name-drop-menu', 'value')],
 )
-def toggle_calculation_results(n, year_car_made, car_price, is_open):
+def toggle_calculation_results(n, n_intervals, year_car_made, car_price, is_open, car_name):
     if n:
+        # failed job is restarted only when button is clicked
+        clicked = callback_context.triggered[0]['prop_id'] == 'tab-2-calcualte-deval-btn.n_clicks'
+        job = get_tab_2_job(car_name, restart_failed=clicked)
+        # results are polled until calculations are finished
+        if not job.done():
+            return True, no_update, 'Duomenys dar skaičiuojami, rezultatai bus parodyti netrukus.', False
+        if job.failed():
+            return True, no_update, 'Nepavyko apskaičiuoti duomenų.', True
+
+        df_model, _, median_model, median_manu = get_data_tab_2(job, car_name)
         # get devaluation years 5 years in the future
         _index = [_ - int(year_car_made) for _ in range(2022, 2027)]
         # get only max range based on available data on all sales
@@ -150,8 +219,8 @@ def toggle_calculation_results(n, year_car_made, car_price, is_open):
         # temp. DataFrame for plotting
         _df = pd.DataFrame(index=_index)
         _df['All'] = YEARLY_MEDIAN.loc[_index]
-        _df = _df.join(DF_TAB_2_MODEL_MEDIAN).rename(columns={'PCT_change': 'Model'})
-        _df = _df.join(DF_TAB_2_MANU_MEDIAN).rename(columns={'PCT_change': 'Manu'})
+        _df = _df.join(median_model).rename(columns={'PCT_change': 'Model'})
+        _df = _df.join(median_manu).rename(columns={'PCT_change': 'Manu'})
         _df.loc[0] = [car_price, car_price, car_price]
         # re-sort values
         _df = _df.sort_index()
@@ -207,18 +276,18 @@ def toggle_calculation_results(n, year_car_made, car_price, is_open):
                           legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5, font_size=14))
 
         # get car manufacturer's name
-        car_manu = DF_TAB_2_MODEL.Car.values[0].split()[0]
+        car_manu = df_model.Car.values[0].split()[0]
 
         markdown_text = f"""
         Automobilio kainos kritimas yra įvertintas su 3-im modeliais:
-        * modelis #1- metinis kainos nuvertėjimas išskaičiuotas tik iš {DF_TAB_2_MODEL.Car.values[0]}
+        * modelis #1- metinis kainos nuvertėjimas išskaičiuotas tik iš {df_model.Car.values[0]}
         * modelis #2- metinis kainos nuvertėjimas išskaičiuotas iš visų {car_manu} gamintojo duomenų,
         * modelis #3- duomenų, metinis kainos nuvertėjimas išskaičiuotas iš visų automobilių duomenų.
         """
 
         if not is_open:
-            return True, fig, markdown_text
-        return no_update, fig, markdown_text
+            return True, fig, markdown_text, True
+        return no_update, fig, markdown_text, True
     return no_update
 
 
@@ -231,8 +300,7 @@ def toggle_calculation_results(n, year_car_made, car_price, is_open):
 )
 def update_slider(year_made, car_name):
     # get price range for 2021 year
-    prices = DF_DEV.loc[(DF_DEV.Car == car_name) & (DF_DEV.Year_made == int(year_made)) & (DF_DEV.Year == 2021)].copy()
-    prices = prices[['Low', 'Medium', 'High']].values
+    prices = BACKEND.get_price_range(car_name, int(year_made), 2021)
     if len(prices):
         return prices.min(), prices.max(), prices.mean()
     return no_update
@@ -273,7 +341,7 @@ def update_tab_1_chart(car_name, year_made):
         return no_update
 
     # generate data for left graph
-    df_plot = utils.get_data_tab_1_graph(DF_DEV, car_name, year_made)
+    df_plot = BACKEND.get_data_tab_1_graph(car_name, year_made)
 
     # create figure object
     fig = px.line(df_plot, x="Year", y="Price", color='Range', hover_data=['Msg', 'Range'],
@@ -293,27 +361,47 @@ def update_tab_1_chart(car_name, year_made):
 
 @app.callback(
     [Output("tab-2-deval-chart", "figure"),
-     Output("tab-2-chart-fig-des", "children")],
-    [Input('tabs-collapse', 'is_open'),
+     Output("tab-2-chart-fig-des", "children"),
+     Output('tab-2-job-progress', 'value'),
+     Output('tab-2-job-progress', 'label'),
+     Output('tab-2-job-collapse', 'is_open'),
+     Output('tab-2-job-interval', 'disabled')],
+    [Input('car-name-drop-menu', 'value'),
+     Input('tab-2-job-interval', 'n_intervals'),
      Input('tab-2-radio-items', 'value'),
      Input('tab-2-change-graph-type-btn', 'n_clicks')])
-def update_tab_2_charts(tabs_open, radio_value, n):
+def update_tab_2_charts(car_name, n_intervals, radio_value, n):
+    """
+    Shows progress of tab 2 data calculations and updates charts when data is ready.
+    Progress is polled until the worker handling the request has finished data.
+    """
     # no update during initial app launch
-    if not tabs_open:
+    if car_name == 'car-name':
         return no_update
 
-    # if limited amount of data available don't update
-    if not len(DF_TAB_2_MODEL):
-        return no_update, 'Permažai duomenų, kad galima būtų įvertinti kainų kitimo tendenciją.'
+    # failed job is restarted only when car is selected again
+    car_selected = callback_context.triggered[0]['prop_id'] == 'car-name-drop-menu.value'
+    job = get_tab_2_job(car_name, restart_failed=car_selected)
 
-    # get car name from global DataFrame
-    car_name = DF_TAB_2_MODEL.Car.unique()[0]
+    if not job.done():
+        progress = int(job.progress * 100)
+        return no_update, no_update, progress, f'{progress}%', True, False
+    if job.failed():
+        return no_update, no_update, 100, 'Nepavyko apskaičiuoti duomenų', True, True
+
+    df_model, df_manu, median_model, median_manu = get_data_tab_2(job, car_name)
+
+    # if limited amount of data available don't update
+    if not len(df_model):
+        txt = 'Permažai duomenų, kad galima būtų įvertinti kainų kitimo tendenciją.'
+        return no_update, txt, 100, '', False, True
 
     if radio_value == 'MODEL':
-        df_plot = DF_TAB_2_MODEL
+        df_plot = df_model
     else:
-        # for manufacturer prices select years specific model was sold on autoplius website
-        df_plot = DF_TAB_2_MANU.loc[DF_TAB_2_MANU.Year_diff.isin(DF_TAB_2_MODEL.Year_diff.unique())]
+        # for manufacturer prices select years specific model was sold on autoplius website,
+        # manufacturer's rows are sampled in background job, so chart size doesn't depend on manufacturer size
+        df_plot = df_manu.loc[df_manu.Year_diff.isin(df_model.Year_diff.unique())]
 
     if n % 2 == 0:
         # create figure with min, max and avg. price changes
@@ -331,32 +419,32 @@ def update_tab_2_charts(tabs_open, radio_value, n):
         fig.update_traces(hovertemplate='%{customdata[0]}')
 
     # add median yearly model's price change
-    fig.add_trace(go.Scatter(x=DF_TAB_2_MODEL_MEDIAN.index, y=DF_TAB_2_MODEL_MEDIAN,
+    fig.add_trace(go.Scatter(x=median_model.index, y=median_model,
                              name=f'{car_name} kainos pokyčio mediana',
                              marker=dict(size=10), line=dict(color='firebrick', width=4, shape='spline'),
                              hovertemplate='%{y:.1f}%'))
 
     # add median yearly manufacturer's price change
-    fig.add_trace(go.Scatter(x=DF_TAB_2_MANU_MEDIAN.loc[DF_TAB_2_MODEL_MEDIAN.index].index,
-                             y=DF_TAB_2_MANU_MEDIAN.loc[DF_TAB_2_MODEL_MEDIAN.index],
+    fig.add_trace(go.Scatter(x=median_manu.loc[median_model.index].index,
+                             y=median_manu.loc[median_model.index],
                              name=f'Visų {car_name.split()[0]} modelių kainos pokyčio mediana',
                              marker=dict(size=10), line=dict(color='teal', width=4, shape='spline'),
                              hovertemplate='%{y:.1f}%'))
 
     # add median yearly all cars and price ranges price change
-    fig.add_trace(go.Scatter(x=YEARLY_MEDIAN.loc[DF_TAB_2_MODEL_MEDIAN.index].index,
-                             y=YEARLY_MEDIAN.loc[DF_TAB_2_MODEL_MEDIAN.index],
+    fig.add_trace(go.Scatter(x=YEARLY_MEDIAN.loc[median_model.index].index,
+                             y=YEARLY_MEDIAN.loc[median_model.index],
                              name=f'Visų automobilių modelių kainos pokyčio mediana',
                              marker=dict(size=10), line=dict(color='GoldenRod', width=4, shape='spline'),
                              hovertemplate='%{y:.1f}%'))
 
     # update axis values
-    fig.update_xaxes(tickvals=np.arange(DF_TAB_2_MODEL_MEDIAN.index.min(), DF_TAB_2_MODEL_MEDIAN.index.max() + 1))
+    fig.update_xaxes(tickvals=np.arange(median_model.index.min(), median_model.index.max() + 1))
     # limit y- axis range if outliers are present
-    _low = DF_TAB_2_MODEL_MEDIAN.max() * 5 < DF_TAB_2_MODEL.PCT_change.max()
-    _high = DF_TAB_2_MODEL_MEDIAN.min() * 5 > DF_TAB_2_MODEL.PCT_change.min()
+    _low = median_model.max() * 5 < df_model.PCT_change.max()
+    _high = median_model.min() * 5 > df_model.PCT_change.min()
     if _low or _high:
-        fig.update_yaxes(range=[DF_TAB_2_MODEL.PCT_change.quantile(0.05), DF_TAB_2_MODEL.PCT_change.quantile(0.95)])
+        fig.update_yaxes(range=[df_model.PCT_change.quantile(0.05), df_model.PCT_change.quantile(0.95)])
 
     # update hover template
     fig.update_layout(legend_title_text='',
@@ -365,7 +453,7 @@ def update_tab_2_charts(tabs_open, radio_value, n):
 
     txt = f"Šią tendenciją palyginame su visų {car_name.split()[0]} pagamintų automobilių " \
           f"ir visų automobilių vidutine kainos kitimo tendencijomis. "
-    return fig, txt
+    return fig, txt, 100, '', False, True
 
 
 if __name__ == '__main__':
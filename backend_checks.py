@@ -0,0 +1,39 @@
+"""
+Helpers for checking that data backends return the same data, used by tests and benchmark_backends.py
+"""
+import numpy as np
+import pandas as pd
+
+
+def generate_synthetic_data(n_manufacturers=40, n_models=25, seed=0):
+    """
+    Generates devaluation prices with same columns as autoplius data.
+    Output:
+        pandas DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_manufacturers):
+        for j in range(n_models):
+            car_name = f'Manu{i} Model {j}'
+            for year_made in range(2000, 2021):
+                price = rng.integers(3000, 60000)
+                for year in range(max(year_made, 2014), 2022):
+                    price = int(price * rng.uniform(0.8, 1.02))
+                    rows.append([car_name, year_made, year, int(price * 0.8), price, int(price * 1.2)])
+    return pd.DataFrame(rows, columns=['Car', 'Year_made', 'Year', 'Low', 'Medium', 'High'])
+
+
+def assert_equal(result_a, result_b):
+    """
+    Compares backend results, frames and series are compared by values
+    """
+    if isinstance(result_a, tuple):
+        for a, b in zip(result_a, result_b):
+            assert_equal(a, b)
+    elif isinstance(result_a, pd.DataFrame):
+        pd.testing.assert_frame_equal(result_a, result_b, check_dtype=False, check_index_type=False)
+    elif isinstance(result_a, pd.Series):
+        pd.testing.assert_series_equal(result_a, result_b, check_dtype=False, check_index_type=False, rtol=1e-5)
+    else:
+        np.testing.assert_allclose(result_a, result_b)
@@ -0,0 +1,210 @@
+import hashlib
+import os
+from urllib.parse import quote
+
+import pandas as pd
+
+import utils
+
+
+# name of the column used to restore original pandas index and row order
+ROW_ID = 'Row_id'
+
+
+def get_manufacturer(car_name):
+    """
+    Returns car's manufacturer name, e.g. 'Volkswagen' from 'Volkswagen Golf'
+    Input:
+        car_name, str
+    Output:
+        str
+    """
+    return car_name.split()[0]
+
+
+class PandasBackend:
+    """
+    Keeps all devaluation data in memory as pandas DataFrames.
+    """
+
+    def __init__(self, df_dev):
+        """
+        Input:
+            df_dev, pandas DataFrame, devaluation prices
+        """
+        self.df_dev = df_dev
+        # transform DataFrame for plotting, calculate yearly changes
+        self.df_yearly = utils.calculate_yearly_changes(df_dev)
+
+    def data_version(self):
+        """
+        Returns hash of devaluation data, changes when data is changed
+        """
+        return hashlib.sha1(pd.util.hash_pandas_object(self.df_dev).values).hexdigest()
+
+    def get_data_tab_1_graph(self, car_name, year_made):
+        return utils.get_data_tab_1_graph(self.df_dev, car_name, year_made)
+
+    def get_data_tab_2_manu(self, car_manufacturer, max_rows=None, progress=None):
+        return utils.get_data_tab_2_manu(self.df_yearly, car_manufacturer, max_rows, progress)
+
+    def get_data_tab_2_model(self, car_name):
+        df = self.df_yearly
+        df_plot_model = utils.gen_hover_msg_tab_2(df.loc[df.Car == car_name])
+        return df_plot_model, df_plot_model.groupby('Year_diff')['PCT_change'].median()
+
+    def get_price_range(self, car_name, year_made, year):
+        """
+        Returns low, medium and high prices of a car made at specific year, e.g. [[7000, 8500, 10000]]
+        Input:
+            car_name, str
+            year_made, int
+            year, int, year prices were collected
+        Output:
+            numpy array
+        """
+        df = self.df_dev
+        prices = df.loc[(df.Car == car_name) & (df.Year_made == year_made) & (df.Year == year)]
+        return prices[['Low', 'Medium', 'High']].values
+
+    def get_yearly_median(self):
+        """
+        Returns median yearly price change of all cars
+        Output:
+            pandas Series, indexed by Year_diff
+        """
+        return self.df_yearly.groupby('Year_diff')['PCT_change'].median()
+
+
+class ParquetBackend:
+    """
+    Queries devaluation data from parquet files on local disk with duckdb.
+    Data is partitioned into one file per manufacturer, so only the selected manufacturer's file is scanned,
+    filters and aggregations are pushed down to duckdb and only selected rows are loaded into memory.
+    Store is created with build_parquet_store function.
+    """
+
+    def __init__(self, path):
+        """
+        Input:
+            path, str, directory created with build_parquet_store
+        """
+        # optional dependency, only needed for this backend
+        import duckdb
+
+        self.path = path
+        self._con = duckdb.connect()
+
+    def _file(self, table, manufacturer):
+        """
+        Returns partition file path for specific manufacturer
+        """
+        file = os.path.join(self.path, table, f"{quote(manufacturer, safe='')}.parquet")
+        # unknown manufacturer has no data
+        if not os.path.exists(file):
+            file = os.path.join(self.path, table, '_empty.parquet')
+        return file
+
+    def _query(self, sql, params):
+        """
+        Executes query and returns pandas DataFrame indexed by original DataFrame's index
+        """
+        # cursors are used for thread safety, connection can't be shared between threads
+        df = self._con.cursor().execute(sql, params).df()
+        if ROW_ID in df:
+            df = df.set_index(ROW_ID).drop(columns='Manufacturer')
+            df.index.name = None
+        return df
+
+    def _select_manufacturer(self, table, manufacturer, where='', params=()):
+        """
+        Selects rows from manufacturer's partition in original row order
+        """
+        return self._query(f"SELECT * FROM read_parquet(?) {where} ORDER BY {ROW_ID}",
+                           [self._file(table, manufacturer), *params])
+
+    def _median_change(self, file, where='', params=()):
+        """
+        Calculates median yearly price change with duckdb
+        """
+        df = self._query(f"SELECT Year_diff, median(PCT_change) AS PCT_change FROM read_parquet(?) {where} "
+                         f"GROUP BY Year_diff ORDER BY Year_diff", [file, *params])
+        return df.set_index('Year_diff')['PCT_change']
+
+    def data_version(self):
+        """
+        Returns hash of store's file names, sizes and modification times, changes when store is rebuilt
+        """
+        files = []
+        for table in ['deval', 'yearly']:
+            for entry in sorted(os.scandir(os.path.join(self.path, table)), key=lambda _: _.name):
+                files.append(f'{table}/{entry.name} {entry.stat().st_size} {entry.stat().st_mtime_ns}')
+        return hashlib.sha1('\n'.join(files).encode()).hexdigest()
+
+    def get_data_tab_1_graph(self, car_name, year_made):
+        # select data for car made at specific year
+        df = self._select_manufacturer('deval', get_manufacturer(car_name),
+                                       'WHERE Car = ? AND Year_made = ?', (car_name, int(year_made)))
+        return utils.get_data_tab_1_graph(df, car_name, year_made)
+
+    def get_data_tab_2_manu(self, car_manufacturer, max_rows=None, progress=None):
+        if max_rows is None:
+            # all rows are plotted, so whole partition is loaded and median is taken from loaded rows
+            df = self._select_manufacturer('yearly', car_manufacturer)
+            median_manu = df.groupby('Year_diff')['PCT_change'].median()
+            return utils.gen_hover_msg_tab_2(df, progress), median_manu
+
+        # median of all rows and rows sampled same way as utils.sample_tab_2 are selected in a single scan
+        group = 'PARTITION BY Range, Year_diff'
+        df = self._query(f"SELECT *, median(PCT_change) OVER (PARTITION BY Year_diff) AS Median_manu "
+                         f"FROM read_parquet(?) "
+                         f"QUALIFY (row_number() OVER ({group} ORDER BY {ROW_ID}) - 1) % "
+                         f"ceil(count(*) OVER ({group}) / ?)::BIGINT = 0 ORDER BY {ROW_ID}",
+                         [self._file('yearly', car_manufacturer), float(max_rows)])
+        median_manu = df.groupby('Year_diff')['Median_manu'].first().rename('PCT_change')
+        return utils.gen_hover_msg_tab_2(df.drop(columns='Median_manu'), progress), median_manu
+
+    def get_data_tab_2_model(self, car_name):
+        file = self._file('yearly', get_manufacturer(car_name))
+        df = self._select_manufacturer('yearly', get_manufacturer(car_name), 'WHERE Car = ?', (car_name,))
+        median_model = self._median_change(file, 'WHERE Car = ?', (car_name,))
+        return utils.gen_hover_msg_tab_2(df), median_model
+
+    def get_price_range(self, car_name, year_made, year):
+        df = self._select_manufacturer('deval', get_manufacturer(car_name),
+                                       'WHERE Car = ? AND Year_made = ? AND Year = ?', (car_name, year_made, year))
+        return df[['Low', 'Medium', 'High']].values
+
+    def get_yearly_median(self):
+        return self._median_change(os.path.join(self.path, 'yearly', '*.parquet'))
+
+
+def build_parquet_store(df_dev, path):
+    """
+    Writes devaluation and yearly price change data to parquet files, one file per manufacturer.
+    Input:
+        df_dev, pandas DataFrame, devaluation prices
+        path, str, output directory
+    """
+    # yearly changes are calculated for all data, same as in PandasBackend
+    tables = {'deval': df_dev, 'yearly': utils.calculate_yearly_changes(df_dev)}
+
+    for table, df in tables.items():
+        os.makedirs(os.path.join(path, table), exist_ok=True)
+        # keep index for restoring row order
+        df = df.copy()
+        df[ROW_ID] = df.index
+        df['Manufacturer'] = df.Car.apply(get_manufacturer)
+        # empty file with same schema for unknown manufacturers
+        df.iloc[:0].to_parquet(os.path.join(path, table, '_empty.parquet'), index=False)
+        for manufacturer, df_manu in df.groupby('Manufacturer'):
+            file = os.path.join(path, table, f"{quote(manufacturer, safe='')}.parquet")
+            df_manu.to_parquet(file, index=False)
+
+
+if __name__ == '__main__':
+    import sys
+
+    # usage: python backends.py <devaluation csv> <output directory>
+    _df = utils.reduce_mem_usage(pd.read_csv(sys.argv[1]))
+    build_parquet_store(_df, sys.argv[2])
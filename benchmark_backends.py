@@ -0,0 +1,160 @@
+"""
+Compares data access backends on scaled devaluation data.
+Checks that both backends return the same data and measures memory usage and query latency.
+
+Usage:
+    python benchmark_backends.py --scale 10
+    python benchmark_backends.py --synthetic --scale 10
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import backends
+import utils
+from backend_checks import assert_equal, generate_synthetic_data
+
+
+DEVAL_CSV = 'https://www.dropbox.com/s/g7u36zpj7i4hlxp/0_all_deval_prices_4.csv?dl=1'
+# same as app's default TAB_2_PLOT_ROWS
+PLOT_ROWS = 100
+
+
+def scale_data(df, scale):
+    """
+    Replicates data with renamed car models, manufacturers are kept the same.
+    Input:
+        df, pandas DataFrame
+        scale, int, how many times data is increased
+    Output:
+        pandas DataFrame
+    """
+    copies = [df]
+    for i in range(1, scale):
+        _df = df.copy()
+        _df['Car'] = _df.Car + f' #{i}'
+        copies.append(_df)
+    return pd.concat(copies, ignore_index=True)
+
+
+def get_backend(name, path):
+    """
+    Creates backend the same way app.py does
+    """
+    if name == 'parquet':
+        return backends.ParquetBackend(os.path.join(path, 'store'))
+    return backends.PandasBackend(utils.reduce_mem_usage(pd.read_pickle(os.path.join(path, 'deval.pkl'))))
+
+
+def run_queries(backend, samples):
+    """
+    Runs same queries as app's callbacks for each car and year,
+    tab_2_manu runs in background job, tab_2_model on every tab 2 chart and calculator request
+    Output:
+        dict, list of latencies in seconds for each query
+    """
+    latency = {'tab_1': [], 'tab_2_manu': [], 'tab_2_model': [], 'price_range': []}
+    for car_name, year_made in samples:
+        car_manufacturer = backends.get_manufacturer(car_name)
+        for key, func, args in [('tab_1', backend.get_data_tab_1_graph, (car_name, year_made)),
+                                ('tab_2_manu', backend.get_data_tab_2_manu, (car_manufacturer, PLOT_ROWS)),
+                                ('tab_2_model', backend.get_data_tab_2_model, (car_name,)),
+                                ('price_range', backend.get_price_range, (car_name, year_made, 2021))]:
+            start = time.perf_counter()
+            func(*args)
+            latency[key].append(time.perf_counter() - start)
+    return latency
+
+
+def peak_memory():
+    """
+    Returns process's peak resident memory in Mb
+    """
+    # ru_maxrss is inherited from parent process after fork, VmHWM is reset for new process
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM'):
+                    return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark(name, path, samples, queue):
+    """
+    Measures backend's memory usage and latency, runs in separate process
+    """
+    start = time.perf_counter()
+    backend = get_backend(name, path)
+    backend.get_yearly_median()
+    startup = time.perf_counter() - start
+    # peak memory in Mb after loading data
+    mem_loaded = peak_memory()
+    latency = run_queries(backend, samples)
+    mem_peak = peak_memory()
+    queue.put((startup, mem_loaded, mem_peak, latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DEVAL_CSV, help='devaluation prices .csv file or url')
+    parser.add_argument('--synthetic', action='store_true', help='use generated data instead of .csv')
+    parser.add_argument('--scale', type=int, default=10, help='how many times data is increased')
+    parser.add_argument('--samples', type=int, default=20, help='number of car models to query')
+    args = parser.parse_args()
+
+    df = generate_synthetic_data() if args.synthetic else pd.read_csv(args.csv)
+    df = scale_data(df, args.scale)
+    print(f'Rows: {len(df)}, cars: {df.Car.nunique()}')
+
+    # sample car models and years made
+    rng = np.random.default_rng(0)
+    cars = df[['Car', 'Year_made']].drop_duplicates().values
+    samples = [(car_name, int(year_made)) for car_name, year_made in
+               cars[rng.choice(len(cars), min(args.samples, len(cars)), replace=False)]]
+
+    with tempfile.TemporaryDirectory() as path:
+        df.to_pickle(os.path.join(path, 'deval.pkl'))
+        backends.build_parquet_store(utils.reduce_mem_usage(df.copy()), os.path.join(path, 'store'))
+        del df
+
+        # check that both backends return the same data
+        pandas_backend = get_backend('pandas', path)
+        parquet_backend = get_backend('parquet', path)
+        assert_equal(pandas_backend.get_yearly_median(), parquet_backend.get_yearly_median())
+        for car_name, year_made in samples:
+            assert_equal(pandas_backend.get_data_tab_1_graph(car_name, year_made),
+                         parquet_backend.get_data_tab_1_graph(car_name, year_made))
+            assert_equal(pandas_backend.get_data_tab_2_manu(backends.get_manufacturer(car_name), PLOT_ROWS),
+                         parquet_backend.get_data_tab_2_manu(backends.get_manufacturer(car_name), PLOT_ROWS))
+            assert_equal(pandas_backend.get_data_tab_2_model(car_name),
+                         parquet_backend.get_data_tab_2_model(car_name))
+            assert_equal(pandas_backend.get_price_range(car_name, year_made, 2021),
+                         parquet_backend.get_price_range(car_name, year_made, 2021))
+        del pandas_backend, parquet_backend
+        print('Backends returned equal data.')
+
+        # each backend runs in fresh process for independent memory measurements
+        ctx = mp.get_context('spawn')
+        for name in ['pandas', 'parquet']:
+            queue = ctx.Queue()
+            process = ctx.Process(target=benchmark, args=(name, path, samples, queue))
+            process.start()
+            startup, mem_loaded, mem_peak, latency = queue.get()
+            process.join()
+
+            print(f'\n{name}: startup {startup:.2f}s, memory after loading {mem_loaded:.0f} Mb, '
+                  f'peak {mem_peak:.0f} Mb')
+            for key, values in latency.items():
+                values = np.array(values) * 1000
+                print(f'  {key:12} p50 {np.percentile(values, 50):8.1f} ms, '
+                      f'p95 {np.percentile(values, 95):8.1f} ms, max {values.max():8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
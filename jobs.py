@@ -0,0 +1,185 @@
+import fcntl
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    Function running on background thread, reports progress from 0 to 1
+    """
+
+    def __init__(self):
+        self.progress = 0
+        self.future = None
+
+    def set_progress(self, progress):
+        self.progress = progress
+
+    def done(self):
+        return self.future.done()
+
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class JobManager:
+    """
+    Runs expensive computations on background threads, so requests don't wait for them.
+    Jobs submitted with the same key share one execution, finished results are kept for the latest keys.
+    Threads are used instead of processes, so large DataFrames are not copied between processes.
+    Jobs are stored per process. With cache_dir, results are shared between processes, e.g. gunicorn workers:
+    a job submitted to several processes is executed by one of them, others wait for its result file.
+    Kept results use the same worker memory as the data backend, so limits should be small
+    when data is not kept in memory, e.g. with backends.ParquetBackend.
+    """
+
+    def __init__(self, max_workers=2, max_results=4, max_size=None, sizeof=None, cache_dir=None, poll_interval=0.2):
+        """
+        Input:
+            max_workers, int, number of background threads
+            max_results, int, number of finished jobs kept in memory, running jobs are not counted
+            max_size, int, optional, total size of kept results, the latest job is kept even if it is larger
+            sizeof, function, optional, returns size of job's result, e.g. number of rows
+            cache_dir, str, optional, directory for results shared between processes, results are pickled
+            poll_interval, float, seconds between checks for result executed by other process
+        """
+        self._executor = ThreadPoolExecutor(max_workers)
+        # reentrant lock, done callback of already finished job runs while lock is held
+        self._lock = threading.RLock()
+        self._jobs = OrderedDict()
+        self.max_results = max_results
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.cache_dir = cache_dir
+        self.poll_interval = poll_interval
+        if cache_dir is not None:
+            # pickled results are loaded, so directory is accessible only by its owner
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+
+    def _size(self):
+        """
+        Returns total size of finished jobs' results
+        """
+        return sum(self.sizeof(job.result()) for job in self._jobs.values() if job.done() and not job.failed())
+
+    def _over_limit(self):
+        if sum(job.done() for job in self._jobs.values()) > self.max_results:
+            return True
+        return self.max_size is not None and self.sizeof is not None and self._size() > self.max_size
+
+    def _remove_old(self):
+        """
+        Removes the oldest finished jobs until results fit into limits
+        """
+        with self._lock:
+            # running jobs and the latest finished job are always kept
+            finished = [key for key, job in self._jobs.items() if job.done()]
+            for key in finished[:-1]:
+                if not self._over_limit():
+                    break
+                del self._jobs[key]
+
+    def submit(self, key, func, *args):
+        """
+        Starts job or returns already submitted job with the same key.
+        func is called with keyword argument progress, function to report job's progress.
+        Input:
+            key, hashable, e.g. car manufacturer name
+            func, function
+        Output:
+            Job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            # failed jobs are restarted
+            if job is not None and not job.failed():
+                self._jobs.move_to_end(key)
+                return job
+
+            job = Job()
+            job.future = self._executor.submit(self._run, key, func, args, job.set_progress)
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            # results size is known after job is finished
+            job.future.add_done_callback(lambda _: self._finished(key, job))
+            self._remove_old()
+            return job
+
+    def _run(self, key, func, args, progress):
+        """
+        Executes job, or waits for its result if other process executes job with the same key
+        """
+        if self.cache_dir is None:
+            return func(*args, progress=progress)
+
+        file = os.path.join(self.cache_dir, quote(str(key), safe=''))
+        while True:
+            if os.path.exists(f'{file}.pkl'):
+                with open(f'{file}.pkl', 'rb') as f:
+                    return pickle.load(f)
+
+            with open(f'{file}.lock', 'a+') as lock:
+                try:
+                    # lock is released when file is closed, also when process is killed
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # other process executes job and writes its progress to lock file
+                    lock.seek(0)
+                    try:
+                        progress(float(lock.read()))
+                    except ValueError:
+                        pass
+                    time.sleep(self.poll_interval)
+                    continue
+                # result could be written by other process after it was checked,
+                # if other process failed, job is executed again
+                if os.path.exists(f'{file}.pkl'):
+                    continue
+
+                def set_progress(value):
+                    progress(value)
+                    lock.truncate(0)
+                    lock.write(str(value))
+                    lock.flush()
+
+                result = func(*args, progress=set_progress)
+                # other processes don't see partially written file
+                tmp = f'{file}.{os.getpid()}_{threading.get_ident()}.tmp'
+                with open(tmp, 'wb') as f:
+                    pickle.dump(result, f)
+                os.replace(tmp, f'{file}.pkl')
+                return result
+
+    def _finished(self, key, job):
+        """
+        Keeps just finished job's result as the latest one and removes old results
+        """
+        # exception is kept by the future, traceback would be lost without logging
+        if job.failed():
+            logger.error(f'Job {key} failed', exc_info=job.future.exception())
+        with self._lock:
+            if self._jobs.get(key) is job:
+                self._jobs.move_to_end(key)
+            self._remove_old()
+
+    def get(self, key):
+        """
+        Returns submitted job or None
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
@@ -81,6 +81,10 @@ tab2_content = dbc.Card(
                            labelCheckedClassName="text-secondary",
                            inputCheckedClassName="border border-primary bg-primary"),
             html.Hr(),
+            # progress of manufacturer's data calculations
+            dbc.Collapse(dbc.Progress(id='tab-2-job-progress', value=0, striped=True, animated=True),
+                         id='tab-2-job-collapse', is_open=False),
+            dcc.Interval(id='tab-2-job-interval', interval=500, disabled=True),
             dcc.Graph(id="tab-2-deval-chart", config={'displayModeBar': False, 'responsive': False}),
             dbc.Button("Pakeisti grafiko tipą", id="tab-2-change-graph-type-btn",
                        className="btn btn-dark", n_clicks=0),
@@ -115,6 +119,8 @@ tab2_content = dbc.Card(
                 id="deval-calculation-results-collapse",
                 is_open=False,
             ),
+            # polls calculator results until manufacturer's data is calculated
+            dcc.Interval(id='tab-2-calc-interval', interval=500, disabled=True),
         ]
     ),
     className="mt-3",
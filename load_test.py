@@ -0,0 +1,407 @@
+"""
+Load testing tool, replays Dash callback traffic of many concurrent users.
+
+Sessions are recorded by clicking through the app as a single user: pick a car, pick a year,
+switch tab 2 chart between model and manufacturer data, toggle chart type and run calculator.
+Every callback request is saved together with the car it was made for and a hash of the response.
+Recorded sessions are replayed as concurrent `_dash-update-component` POST requests and
+latency, throughput and error rate are reported per callback. Latency of a step is measured from its first request
+until the final response, e.g. until chart is rendered after progress polling, polls are counted separately.
+Responses computed for another car, or differing from single user responses, are counted as wrong.
+
+Usage:
+    python load_test.py --start record --sessions 20 -o sessions.json
+    python load_test.py --start --workers 4 run --users 200 sessions.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+# car names found in callback responses, used to detect responses computed for another car
+CAR_PATTERNS = [re.compile(r'^(?!Visų )(.+) kainos pokyčio mediana$'),
+                re.compile(r'išskaičiuotas tik iš (.+?)\s*$', re.M),
+                re.compile(r'metais pagamintų (.+?) automobilių kainos')]
+# seconds between progress requests, same as tab-2-job-interval
+POLL_INTERVAL = 0.5
+# default max seconds of polling for a single step
+MAX_WAIT = 120
+
+
+class DashClient:
+    """
+    Sends callback requests to running dash app
+    """
+
+    def __init__(self, url, timeout=120):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        # callbacks are found by one of their output, e.g. 'tab-2-price.value'
+        self.dependencies = self._get_json('/_dash-dependencies')
+
+    def _get_json(self, path):
+        with urllib.request.urlopen(self.url + path, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def get_layout(self):
+        return self._get_json('/_dash-layout')
+
+    def find_callback(self, output):
+        """
+        Returns callback dependency which updates output, e.g. 'tab-2-price.value'
+        """
+        for dep in self.dependencies:
+            if output in dep['output'].strip('.').split('...'):
+                return dep
+        raise KeyError(f'No callback found for {output}')
+
+    def build_payload(self, output, inputs, state=(), changed=None):
+        """
+        Creates request body the same way dash renderer does
+        Input:
+            output, str, one of callback's outputs
+            inputs, list, input values in same order as callback's inputs
+            state, list, state values in same order as callback's state
+            changed, str, optional, input which triggered callback, e.g. 'tab-2-job-interval.n_intervals',
+                by default all inputs
+        Output:
+            dict
+        """
+        dep = self.find_callback(output)
+        outputs = [dict(zip(['id', 'property'], _.rsplit('.', 1))) for _ in dep['output'].strip('.').split('...')]
+        _inputs = [{**_, 'value': value} for _, value in zip(dep['inputs'], inputs)]
+        return {'output': dep['output'],
+                'outputs': outputs if dep['output'].startswith('..') else outputs[0],
+                'inputs': _inputs,
+                'changedPropIds': [changed] if changed else [f"{_['id']}.{_['property']}" for _ in dep['inputs']],
+                'state': [{**_, 'value': value} for _, value in zip(dep['state'], state)]}
+
+    def post(self, payload):
+        """
+        Sends callback request
+        Output:
+            int, str, response status and body
+        """
+        request = urllib.request.Request(self.url + '/_dash-update-component', data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode(errors='replace')
+
+
+def response_cars(body):
+    """
+    Returns set of car names found in callback response's text values
+    """
+    def strings(value):
+        if isinstance(value, dict):
+            value = list(value.values())
+        if isinstance(value, list):
+            return [_ for v in value for _ in strings(v)]
+        return [value] if isinstance(value, str) else []
+
+    return {car for text in strings(json.loads(body)) for pattern in CAR_PATTERNS for car in pattern.findall(text)}
+
+
+def response_hash(status, body):
+    return hashlib.sha1(f'{status}{body}'.encode()).hexdigest()
+
+
+def poll_status(step, status, body):
+    """
+    Checks if polled callback is finished
+    Output:
+        str, 'done' if response updates step's until component, 'failed' if polling interval was disabled
+        without it, otherwise 'polling'
+    """
+    if step.get('until') is None:
+        return 'done'
+    response = json.loads(body)['response'] if status == 200 else {}
+    if step['until'] in response:
+        return 'done'
+    if response.get(step['interval'], {}).get('disabled'):
+        return 'failed'
+    return 'polling'
+
+
+def get_car_names(client):
+    """
+    Returns car names from car dropdown menu options
+    """
+    def find(component):
+        if isinstance(component, dict):
+            if component.get('props', {}).get('id') == 'car-name-drop-menu':
+                return [_['value'] for _ in component['props']['options']]
+            children = component.get('props', {}).get('children')
+            return find(children)
+        if isinstance(component, list):
+            for child in component:
+                cars = find(child)
+                if cars:
+                    return cars
+        return None
+
+    return find(client.get_layout())
+
+
+def record_session(client, car_name, rng, max_wait=MAX_WAIT):
+    """
+    Clicks through app as a single user and records callback requests, polling is stopped after max_wait seconds
+    Output:
+        list, steps with callback name, request payload, car name and response hash
+    """
+    steps = []
+
+    def call(name, output, inputs, state=(), changed=None, until=None, interval=None):
+        step = {'callback': name, 'payload': client.build_payload(output, inputs, state, changed),
+                'car': car_name, 'until': until, 'interval': interval}
+        # request is repeated by interval until response updates component until, e.g. progress polling
+        if interval is not None:
+            step['poll_payload'] = client.build_payload(output, inputs, state, f'{interval}.n_intervals')
+        payload = step['payload']
+        start = time.monotonic()
+        while True:
+            status, body = client.post(payload)
+            if status not in (200, 204):
+                raise RuntimeError(f'{name} failed with status {status}: {body[:200]}')
+            result = poll_status(step, status, body)
+            if result == 'failed':
+                raise RuntimeError(f'{name} polling stopped without updating {until}')
+            if result == 'done':
+                break
+            if time.monotonic() - start > max_wait:
+                raise RuntimeError(f'{name} did not update {until} in {max_wait}s')
+            payload = step['poll_payload']
+            time.sleep(POLL_INTERVAL)
+        step['response'] = response_hash(status, body)
+        steps.append(step)
+        return json.loads(body)['response'] if status == 200 else {}
+
+    def tab_2_chart(radio_value, n_clicks, changed):
+        # chart is updated when tab 2 data is calculated
+        call('update_tab_2_charts', 'tab-2-deval-chart.figure', [car_name, 0, radio_value, n_clicks],
+             changed=changed, until='tab-2-chart-fig-des', interval='tab-2-job-interval')
+
+    # pick a car
+    response = call('update_year_made', 'tabs-collapse.is_open', [car_name])
+    years = [_['value'] for _ in response['car-year-drop-menu']['options']]
+    year = years[0]
+    call('update_tab_1_chart', 'tab-1-deval-chart.figure', [car_name, year])
+    call('autoplius_png', 'deval-auto-plius-img.src', [car_name, year])
+    tab_2_chart('MODEL', 0, 'car-name-drop-menu.value')
+
+    # pick a year
+    year = rng.choice(years)
+    call('update_tab_1_chart', 'tab-1-deval-chart.figure', [car_name, year])
+    call('autoplius_png', 'deval-auto-plius-img.src', [car_name, year])
+
+    # switch to tab 2, change chart data and type
+    n_clicks = 0
+    for radio_value in rng.sample(['MODEL', 'MANU'], 2):
+        tab_2_chart(radio_value, n_clicks, 'tab-2-radio-items.value')
+        n_clicks += 1
+        tab_2_chart(radio_value, n_clicks, 'tab-2-change-graph-type-btn.n_clicks')
+
+    # run calculator
+    response = call('update_slider', 'price-slider.value', [year], [car_name])
+    if response:
+        price = call('update_price', 'tab-2-price.value', [response['price-slider']['value']])
+        price = price['tab-2-price']['value']
+        call('activate_calculation_btn', 'tab-2-calcualte-deval-btn.disabled', [year, price])
+        call('toggle_calculation_results', 'markdown-text.children', [1, 0], [year, price, False, car_name],
+             changed='tab-2-calcualte-deval-btn.n_clicks', until='tab-2-calc-chart', interval='tab-2-calc-interval')
+    return steps
+
+
+def percentile(values, q):
+    """
+    Returns q-th percentile of sorted values
+    """
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class Stats:
+    """
+    Collects thread safe step results per callback
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def add(self, callback, latency, polls, error, wrong_car, mismatch):
+        """
+        Input:
+            callback, str
+            latency, float, seconds from step's first request until final response
+            polls, int, number of progress requests after the first one
+            error, bool
+            wrong_car, bool, any response was computed for another car
+            mismatch, bool, final response differs from recorded one
+        """
+        with self.lock:
+            self.results.setdefault(callback, []).append((latency, polls, error, wrong_car, mismatch))
+
+    def report(self, duration):
+        header = f"{'callback':28}{'steps':>7}{'steps/s':>8}{'polls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}" \
+                 f"{'errors':>8}{'wrong car':>10}{'mismatch':>9}"
+        lines = [header, '-' * len(header)]
+        rows = sorted(self.results.items()) + [('total', [_ for v in self.results.values() for _ in v])]
+        for callback, results in rows:
+            latency = sorted(_[0] * 1000 for _ in results)
+            n = len(results)
+            lines.append(f'{callback:28}{n:7d}{n / duration:8.1f}{sum(_[1] for _ in results):7d}'
+                         f'{percentile(latency, 50):9.0f}{percentile(latency, 95):9.0f}{percentile(latency, 99):9.0f}'
+                         f'{100 * sum(_[2] for _ in results) / n:7.1f}%{sum(_[3] for _ in results):10d}'
+                         f'{sum(_[4] for _ in results):9d}')
+        requests = sum(len(v) + sum(_[1] for _ in v) for v in self.results.values())
+        lines.append(f'HTTP requests including polls: {requests}, {requests / duration:.1f} req/s')
+        return '\n'.join(lines)
+
+
+def replay_session(client, steps, stats, think_time, deadline, max_wait=MAX_WAIT):
+    """
+    Replays recorded session steps in order, stops after deadline.
+    Progress polling of a step is stopped after max_wait seconds and counted as an error.
+    """
+    for step in steps:
+        if time.monotonic() > deadline:
+            return
+        payload = step['payload']
+        start = time.perf_counter()
+        polls = -1
+        wrong_car = False
+        while True:
+            polls += 1
+            try:
+                status, body = client.post(payload)
+            except Exception:
+                error, result = True, 'done'
+                break
+            error = status not in (200, 204)
+            # progress requests are repeated until job is finished, stopped polling without result is an error
+            result = poll_status(step, status, body) if not error else 'done'
+            error = error or result == 'failed'
+            cars = response_cars(body) if status == 200 else set()
+            wrong_car = wrong_car or bool(cars - {step['car']})
+            if result != 'polling':
+                break
+            if time.perf_counter() - start > max_wait:
+                error = True
+                break
+            payload = step['poll_payload']
+            time.sleep(POLL_INTERVAL)
+        # latency is time user waits for final response, only the final response is compared
+        mismatch = result == 'done' and not error and response_hash(status, body) != step['response']
+        stats.add(step['callback'], time.perf_counter() - start, polls, error, wrong_car, mismatch)
+        if think_time:
+            time.sleep(random.uniform(0, 2 * think_time))
+
+
+def start_server(host, port, workers, threads):
+    """
+    Starts app with gunicorn and waits until it is ready
+    """
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:server', '--bind', f'{host}:{port}',
+                                '--workers', str(workers), '--threads', str(threads), '--timeout', '300'],
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f'http://{host}:{port}'
+    # app downloads data during startup
+    for _ in range(600):
+        if process.poll() is not None:
+            raise RuntimeError('Server failed to start')
+        try:
+            urllib.request.urlopen(url + '/_dash-layout', timeout=5)
+            return process, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(1)
+    process.terminate()
+    raise RuntimeError('Server did not start in time')
+
+
+def record(args, url):
+    client = DashClient(url)
+    rng = random.Random(args.seed)
+    car_names = get_car_names(client)
+    sessions = [record_session(client, car_name, rng, args.max_wait)
+                for car_name in rng.sample(car_names, min(args.sessions, len(car_names)))]
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(sessions, f, ensure_ascii=False)
+    print(f'Recorded {len(sessions)} sessions, {sum(len(_) for _ in sessions)} requests to {args.output}')
+
+
+def run(args, url):
+    with open(args.sessions, encoding='utf-8') as f:
+        sessions = json.load(f)
+    client = DashClient(url)
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + args.duration if args.duration else float('inf')
+
+    def user(i):
+        # each user replays random sessions until deadline or a single session if duration is not set
+        rng = random.Random(i)
+        replay_session(client, rng.choice(sessions), stats, args.think_time, deadline, args.max_wait)
+        while args.duration and time.monotonic() < deadline:
+            replay_session(client, rng.choice(sessions), stats, args.think_time, deadline, args.max_wait)
+
+    with ThreadPoolExecutor(args.users) as executor:
+        list(executor.map(user, range(args.users)))
+    print(stats.report(time.monotonic() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help='running app url')
+    parser.add_argument('--start', action='store_true', help='start app locally with gunicorn')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT,
+                        help='max seconds of progress polling for a single step')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='record user sessions')
+    record_parser.add_argument('--sessions', type=int, default=20, help='number of sessions, one car per session')
+    record_parser.add_argument('--seed', type=int, default=0)
+    record_parser.add_argument('-o', '--output', default='sessions.json')
+
+    run_parser = subparsers.add_parser('run', help='replay recorded sessions concurrently')
+    run_parser.add_argument('sessions', help='recorded sessions .json file')
+    run_parser.add_argument('--users', type=int, default=200, help='number of concurrent users')
+    run_parser.add_argument('--duration', type=float, default=0,
+                            help='seconds to replay sessions, by default each user replays one session')
+    run_parser.add_argument('--think-time', type=float, default=0, help='average seconds between user clicks')
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if args.start:
+        process, url = start_server('127.0.0.1', args.port, args.workers, args.threads)
+    try:
+        if args.command == 'record':
+            record(args, url)
+        else:
+            run(args, url)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
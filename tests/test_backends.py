@@ -0,0 +1,72 @@
+from importlib.util import find_spec
+
+import pytest
+
+import backends
+import utils
+from backend_checks import assert_equal, generate_synthetic_data
+
+# parquet backend requires optional dependencies
+PARQUET = pytest.param('parquet', marks=pytest.mark.skipif(not (find_spec('duckdb') and find_spec('pyarrow')),
+                                                            reason='duckdb and pyarrow are required'))
+
+CARS = ['Manu0 Model 0', 'Manu1 Model 2', 'Manu2 Model 1', 'Manu1 Unknown', 'Unknown Model']
+
+
+@pytest.fixture(scope='module')
+def df_dev():
+    return utils.reduce_mem_usage(generate_synthetic_data(n_manufacturers=3, n_models=3))
+
+
+@pytest.fixture(scope='module')
+def expected(df_dev):
+    # in-memory data and utils functions are the reference
+    return backends.PandasBackend(df_dev.copy())
+
+
+@pytest.fixture(scope='module', params=['pandas', PARQUET])
+def backend(request, df_dev, tmp_path_factory):
+    if request.param == 'parquet':
+        path = str(tmp_path_factory.mktemp('store'))
+        backends.build_parquet_store(df_dev.copy(), path)
+        return backends.ParquetBackend(path)
+    return backends.PandasBackend(df_dev.copy())
+
+
+@pytest.mark.parametrize('car_name', CARS)
+@pytest.mark.parametrize('year_made', [2000, 2015, 2020])
+def test_get_data_tab_1_graph(backend, df_dev, car_name, year_made):
+    assert_equal(backend.get_data_tab_1_graph(car_name, year_made),
+                 utils.get_data_tab_1_graph(df_dev, car_name, year_made))
+
+
+@pytest.mark.parametrize('car_manufacturer', ['Manu0', 'Manu2', 'Unknown'])
+@pytest.mark.parametrize('max_rows', [None, 1, 4])
+def test_get_data_tab_2_manu(backend, expected, car_manufacturer, max_rows):
+    progress = []
+    result = backend.get_data_tab_2_manu(car_manufacturer, max_rows, progress=progress.append)
+    assert_equal(result, utils.get_data_tab_2_manu(expected.df_yearly, car_manufacturer, max_rows))
+    # progress is reported until all rows are processed
+    if len(result[0]):
+        assert progress[-1] == 1
+    # plotted rows are limited, median is calculated from all rows
+    if max_rows is not None and len(result[0]):
+        assert result[0].groupby(['Range', 'Year_diff']).size().max() <= max_rows
+        assert_equal(result[1], utils.get_data_tab_2_manu(expected.df_yearly, car_manufacturer)[1])
+
+
+@pytest.mark.parametrize('car_name', CARS)
+def test_get_data_tab_2_model(backend, expected, car_name):
+    df_plot_manu, _ = utils.get_data_tab_2_manu(expected.df_yearly, backends.get_manufacturer(car_name))
+    assert_equal(backend.get_data_tab_2_model(car_name), utils.get_data_tab_2_model(df_plot_manu, car_name))
+
+
+@pytest.mark.parametrize('car_name', CARS)
+@pytest.mark.parametrize('year', [2016, 2021])
+def test_get_price_range(backend, df_dev, car_name, year):
+    prices = df_dev.loc[(df_dev.Car == car_name) & (df_dev.Year_made == 2012) & (df_dev.Year == year)]
+    assert_equal(backend.get_price_range(car_name, 2012, year), prices[['Low', 'Medium', 'High']].values)
+
+
+def test_get_yearly_median(backend, expected):
+    assert_equal(backend.get_yearly_median(), expected.df_yearly.groupby('Year_diff')['PCT_change'].median())
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import jobs
+
+
+def blocked_func(result):
+    """
+    Returns job function which waits until release is set, result can be exception to raise
+    """
+    release = threading.Event()
+
+    def func(progress):
+        release.wait(5)
+        progress(1)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return func, release
+
+
+def run_job(manager, key, result=None):
+    """
+    Submits job and waits until manager has handled its result
+    """
+    func, release = blocked_func(result)
+    handled = threading.Event()
+    job = manager.submit(key, func)
+    # callbacks run in order, manager's callback is the first one
+    job.future.add_done_callback(lambda _: handled.set())
+    release.set()
+    assert handled.wait(5)
+    return job
+
+
+def test_finished_result_kept_while_jobs_queued():
+    manager = jobs.JobManager(max_workers=2, max_results=4)
+    job_a = run_job(manager, 'A', 'A')
+
+    # queued and running jobs don't count toward limit
+    func, release = blocked_func(None)
+    queued = [manager.submit(key, func) for key in 'BCDEF']
+    assert manager.get('A') is job_a
+    release.set()
+    for job in queued:
+        job.result(timeout=5)
+
+
+def test_same_key_shares_job():
+    manager = jobs.JobManager()
+    calls = []
+    func, release = blocked_func('result')
+    job = manager.submit('A', lambda progress: calls.append(1) or func(progress))
+    assert manager.submit('A', func) is job
+    release.set()
+    assert job.result(timeout=5) == 'result'
+    assert manager.submit('A', func) is job
+    assert len(calls) == 1
+    assert job.progress == 1
+
+
+def test_failed_job_restarted(caplog):
+    manager = jobs.JobManager()
+    job = run_job(manager, 'A', ValueError('no data'))
+    assert job.failed()
+    assert 'ValueError: no data' in caplog.text
+    # failed job is returned by get, submit starts it again
+    assert manager.get('A') is job
+    job = manager.submit('A', lambda progress: 'result')
+    assert job.result(timeout=5) == 'result'
+    assert not job.failed()
+
+
+def test_oldest_results_removed():
+    manager = jobs.JobManager(max_results=2)
+    for key in 'ABC':
+        run_job(manager, key)
+    assert list(manager._jobs) == ['B', 'C']
+    # used results are kept longer
+    manager.get('B')
+    run_job(manager, 'D')
+    assert list(manager._jobs) == ['B', 'D']
+
+
+def test_results_removed_by_size():
+    manager = jobs.JobManager(max_results=10, max_size=5, sizeof=len)
+    run_job(manager, 'A', 'aa')
+    run_job(manager, 'B', 'bbb')
+    assert list(manager._jobs) == ['A', 'B']
+    run_job(manager, 'C', 'c')
+    assert list(manager._jobs) == ['B', 'C']
+    # the latest result is kept even if it is larger than limit
+    run_job(manager, 'D', 'd' * 10)
+    assert list(manager._jobs) == ['D']
+
+
+def test_results_removed_while_jobs_queued():
+    manager = jobs.JobManager(max_workers=1, max_results=1)
+    job_a = run_job(manager, 'A')
+    func, release = blocked_func(None)
+    queued = [manager.submit(key, func) for key in 'BC']
+    # running jobs are never removed
+    assert manager.get('A') is job_a
+    handled = threading.Event()
+    queued[-1].future.add_done_callback(lambda _: handled.set())
+    release.set()
+    assert handled.wait(5)
+    assert list(manager._jobs) == ['C']
+
+
+def test_result_shared_between_managers(tmp_path):
+    # managers with the same cache directory act as different gunicorn workers
+    manager_a = jobs.JobManager(cache_dir=str(tmp_path), poll_interval=0.01)
+    manager_b = jobs.JobManager(cache_dir=str(tmp_path), poll_interval=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def func(progress):
+        started.set()
+        progress(0.5)
+        release.wait(5)
+        return 'result'
+
+    job_a = manager_a.submit('A', func)
+    assert started.wait(5)
+    calls = []
+    job_b = manager_b.submit('A', lambda progress: calls.append(1))
+    # waiting job reports progress of executing job
+    for _ in range(500):
+        if job_b.progress == 0.5:
+            break
+        time.sleep(0.01)
+    assert job_b.progress == 0.5 and not job_b.done()
+    release.set()
+    assert job_a.result(timeout=5) == job_b.result(timeout=5) == 'result'
+    assert not calls
+    # finished result is loaded from file
+    manager_c = jobs.JobManager(cache_dir=str(tmp_path))
+    assert manager_c.submit('A', lambda progress: calls.append(1)).result(timeout=5) == 'result'
+    assert not calls
+
+
+def test_failed_shared_job_executed_again(tmp_path):
+    manager_a = jobs.JobManager(cache_dir=str(tmp_path), poll_interval=0.01)
+    manager_b = jobs.JobManager(cache_dir=str(tmp_path), poll_interval=0.01)
+    started = threading.Event()
+    func, release = blocked_func(ValueError('no data'))
+    job_a = manager_a.submit('A', lambda progress: started.set() or func(progress))
+    assert started.wait(5)
+    job_b = manager_b.submit('A', lambda progress: 'result')
+    release.set()
+    assert job_a.future.exception(timeout=5) is not None
+    # other worker executes job itself when executing worker fails
+    assert job_b.result(timeout=5) == 'result'
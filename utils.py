@@ -137,33 +137,17 @@ def get_data_tab_1_graph(df, car_name, year_made):
     return df_plot
 
 
-def get_data_tab_2_graph(df, car_name):
+def gen_hover_msg_tab_2(df_plot, progress=None, chunk_size=1000):
     """
-    Transforms pandas DataFrame for plotting prices.
-    Calculates median price change
+    Creates new column with message for hovering with mouse over yearly price changes.
     Input:
-        df, pandas DataFrame
-        car_name, str, car name, e.g. 'Volkswagen Golf Sportsvan'
+        df_plot, pandas DataFrame, yearly price changes
+        progress, function, optional, called with share of rows processed, e.g. 0.5
+        chunk_size, int, number of rows processed between progress updates
     Output:
         pandas DataFrame
     """
-    # copy yearly change DataFrame
-    df_yearly = df.copy()
-
-    # get car's manufacturer name
-    car_manufacturer = car_name.split()[0]
-
-    # create condition to select all cars from same manufacturer
-    cond = df_yearly.Car.apply(lambda x: x.split()[0])
-    # select data only for chosen car manufacturer
-    df_plot_manu = df_yearly.loc[cond == car_manufacturer].copy()
-    # select data only for chosen car name
-    df_plot_model = df_yearly.loc[df_yearly.Car == car_name].copy()
-
-    # calculate median model price change
-    median_model = df_plot_model.groupby('Year_diff')['PCT_change'].median()
-    # calculate median car's manufacturer price change
-    median_manu = df_plot_manu.groupby('Year_diff')['PCT_change'].median()
+    df_plot = df_plot.copy()
 
     def gen_hover_txt(row):
         """
@@ -186,13 +170,95 @@ def get_data_tab_2_graph(df, car_name):
         # remove y-axis label from appearing during hover
         return msg + '<extra></extra>'
 
-    # generate hover messages
-    df_plot_model['Hover_msg'] = df_plot_model.apply(gen_hover_txt, axis=1)
-    df_plot_manu['Hover_msg'] = df_plot_manu.apply(gen_hover_txt, axis=1)
+    # generate hover messages in chunks to report progress
+    hover_msg = []
+    for i in range(0, len(df_plot), chunk_size):
+        hover_msg.append(df_plot.iloc[i:i + chunk_size].apply(gen_hover_txt, axis=1))
+        if progress is not None:
+            progress(min(i + chunk_size, len(df_plot)) / len(df_plot))
+    # no data for unknown car
+    df_plot['Hover_msg'] = pd.concat(hover_msg) if hover_msg else ''
 
     # flip order for plotly colors, the highest price should be first, lowest- last
-    df_plot_model = df_plot_model.iloc[::-1]
-    df_plot_manu = df_plot_manu.iloc[::-1]
+    return df_plot.iloc[::-1]
+
+
+def sample_tab_2(df_plot, max_rows):
+    """
+    Selects evenly spaced rows of each price range and year difference,
+    so size of plotted data doesn't grow with number of manufacturer's models.
+    Input:
+        df_plot, pandas DataFrame, yearly price changes
+        max_rows, int, max number of rows for each price range and year difference
+    Output:
+        pandas DataFrame
+    """
+    groups = df_plot.groupby(['Range', 'Year_diff'])
+    # every step-th row of a group is selected, the first row is always kept
+    step = np.ceil(groups['PCT_change'].transform('size') / max_rows)
+    return df_plot.loc[groups.cumcount() % step == 0]
+
+
+def get_data_tab_2_manu(df, car_manufacturer, max_rows=None, progress=None):
+    """
+    Selects yearly price changes of all car manufacturer's models.
+    Calculates median price change and creates hover messages.
+    Input:
+        df, pandas DataFrame
+        car_manufacturer, str, car manufacturer's name, e.g. 'Volkswagen'
+        max_rows, int, optional, max number of plotted rows for each price range and year difference
+        progress, function, optional, called with share of rows processed, e.g. 0.5
+    Output:
+        pandas DataFrame, pandas Series
+    """
+    # find manufacturer's models from unique car names instead of splitting every row
+    car_names = [car_name for car_name in df.Car.unique() if car_name.split()[0] == car_manufacturer]
+    # select data only for chosen car manufacturer
+    df_plot_manu = df.loc[df.Car.isin(car_names)]
+
+    # calculate median car's manufacturer price change from all rows
+    median_manu = df_plot_manu.groupby('Year_diff')['PCT_change'].median()
+
+    if max_rows is not None:
+        df_plot_manu = sample_tab_2(df_plot_manu, max_rows)
+
+    return gen_hover_msg_tab_2(df_plot_manu, progress), median_manu
+
+
+def get_data_tab_2_model(df_plot_manu, car_name):
+    """
+    Selects specific car model from manufacturer's data.
+    Calculates median price change
+    Input:
+        df_plot_manu, pandas DataFrame, output of get_data_tab_2_manu
+        car_name, str, car name, e.g. 'Volkswagen Golf Sportsvan'
+    Output:
+        pandas DataFrame, pandas Series
+    """
+    # select data only for chosen car name
+    df_plot_model = df_plot_manu.loc[df_plot_manu.Car == car_name].copy()
+    # calculate median model price change
+    median_model = df_plot_model.groupby('Year_diff')['PCT_change'].median()
+
+    return df_plot_model, median_model
+
+
+def get_data_tab_2_graph(df, car_name):
+    """
+    Transforms pandas DataFrame for plotting prices.
+    Calculates median price change
+    Input:
+        df, pandas DataFrame
+        car_name, str, car name, e.g. 'Volkswagen Golf Sportsvan'
+    Output:
+        pandas DataFrame
+    """
+    # get car's manufacturer name
+    car_manufacturer = car_name.split()[0]
+
+    # model's data is a subset of manufacturer's data
+    df_plot_manu, median_manu = get_data_tab_2_manu(df, car_manufacturer)
+    df_plot_model, median_model = get_data_tab_2_model(df_plot_manu, car_name)
 
     # for manufacturer prices select years specific model was sold on autoplius website
     return df_plot_model, df_plot_manu, median_model, median_manu